@@ -1,20 +1,26 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, request, jsonify, render_template_string, stream_with_context
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
 import matplotlib.pyplot as plt
 import io
 import base64
+import csv
 from datetime import datetime
-import sqlite3
-import threading
+import os
+import tempfile
 import json
+import click
+from storage import METRIC_COLUMNS, MemoryEngine, SQLiteEngine, metric_to_row, run_workload
 
 app = Flask(__name__)
 
 # Database configuration
 DATABASE = 'metrics.db'
+STORAGE_ENGINE = os.environ.get('STORAGE_ENGINE', 'sqlite')
 max_entries = 100
-db_lock = threading.Lock()
+
+# Bulk export/import configuration
+EXPORT_FORMATS = ('csv', 'ndjson')
 
 # HTML template with embedded table and charts
 HTML_TEMPLATE = '''
@@ -283,220 +289,117 @@ while True:
 
 # ==================== DATABASE FUNCTIONS ====================
 
-def init_db():
-    """Initialize the SQLite database."""
-    with db_lock:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        
-        # Create metrics table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS metrics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                client_id TEXT NOT NULL,
-                client_name TEXT,
-                timestamp TEXT NOT NULL,
-                received_at TEXT NOT NULL,
-                cpu_percent REAL,
-                gpu_percent REAL,
-                ram_json TEXT,
-                ping_ms REAL,
-                internet_connected INTEGER,
-                raw_data TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create index for faster queries
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_client_id ON metrics(client_id)
-        ''')
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_timestamp ON metrics(timestamp DESC)
-        ''')
-        
-        conn.commit()
-        conn.close()
+def create_storage():
+    """Build the storage engine selected by STORAGE_ENGINE."""
+    if STORAGE_ENGINE == 'memory':
+        return MemoryEngine(capacity=max_entries)
+    if STORAGE_ENGINE == 'sqlite':
+        return SQLiteEngine(DATABASE)
+    raise ValueError('Unknown STORAGE_ENGINE {!r}, expected sqlite or memory'.format(STORAGE_ENGINE))
 
-def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+storage = create_storage()
+
+def init_db():
+    """Initialize the storage engine."""
+    storage.init()
 
 def cleanup_old_metrics(client_id):
     """Keep only the latest max_entries for each client."""
-    with db_lock:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Count entries for this client
-        cursor.execute('SELECT COUNT(*) as count FROM metrics WHERE client_id = ?', (client_id,))
-        count = cursor.fetchone()['count']
-        
-        if count > max_entries:
-            # Delete oldest entries
-            cursor.execute('''
-                DELETE FROM metrics 
-                WHERE client_id = ? 
-                AND id NOT IN (
-                    SELECT id FROM metrics 
-                    WHERE client_id = ? 
-                    ORDER BY timestamp DESC 
-                    LIMIT ?
-                )
-            ''', (client_id, client_id, max_entries))
-            conn.commit()
-        
-        conn.close()
+    storage.apply_retention(client_id, max_entries)
 
 def insert_metric(client_id, data):
     """Insert a metric into the database."""
-    with db_lock:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Extract fields
-        client_name = data.get('client_name')
-        timestamp = data.get('timestamp')
-        received_at = data.get('received_at')
-        cpu_percent = data.get('cpu_percent')
-        gpu_percent = data.get('gpu_percent')
-        ram = data.get('ram')
-        ping_ms = data.get('ping_ms')
-        internet_connected = data.get('internet_connected')
-        
-        # Convert RAM to JSON string
-        ram_json = json.dumps(ram) if ram else None
-        
-        # Store complete raw data as JSON
-        raw_data = json.dumps(data)
-        
-        cursor.execute('''
-            INSERT INTO metrics 
-            (client_id, client_name, timestamp, received_at, cpu_percent, gpu_percent, 
-             ram_json, ping_ms, internet_connected, raw_data)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (client_id, client_name, timestamp, received_at, cpu_percent, gpu_percent,
-              ram_json, ping_ms, internet_connected, raw_data))
-        
-        conn.commit()
-        
-        # Get count for this client
-        cursor.execute('SELECT COUNT(*) as count FROM metrics WHERE client_id = ?', (client_id,))
-        count = cursor.fetchone()['count']
-        
-        conn.close()
-        
-        # Cleanup old entries
-        cleanup_old_metrics(client_id)
-        
-        return count
-
-def get_all_metrics(limit=50):
-    """Get all metrics from database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    storage.insert_batch([(client_id, data)])
     
-    cursor.execute('''
-        SELECT * FROM metrics 
-        ORDER BY timestamp DESC 
-        LIMIT ?
-    ''', (limit,))
+    # Get count for this client
+    count = storage.count(client_id)
     
-    rows = cursor.fetchall()
-    conn.close()
+    # Cleanup old entries
+    cleanup_old_metrics(client_id)
     
-    # Convert to list of dicts
-    metrics = []
-    for row in rows:
-        metric = json.loads(row['raw_data'])
-        metric['client_id'] = row['client_id']
-        metrics.append(metric)
-    
-    return metrics
+    return count
+
+def get_all_metrics(limit=50):
+    """Get all metrics from database."""
+    return storage.query_range(limit=limit)
 
 def get_client_metrics(client_id=None, limit=20):
     """Get metrics for a specific client or all clients."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    if client_id:
-        cursor.execute('''
-            SELECT * FROM metrics 
-            WHERE client_id = ?
-            ORDER BY timestamp DESC 
-            LIMIT ?
-        ''', (client_id, limit))
-    else:
-        cursor.execute('''
-            SELECT * FROM metrics 
-            ORDER BY timestamp DESC 
-            LIMIT ?
-        ''', (limit,))
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    # Convert to list of dicts
-    metrics = []
-    for row in rows:
-        metric = json.loads(row['raw_data'])
-        metric['client_id'] = row['client_id']
-        metrics.append(metric)
-    
-    return metrics
+    return storage.query_range(client_id=client_id, limit=limit)
 
 def get_total_clients():
     """Get count of unique clients."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT COUNT(DISTINCT client_id) as count FROM metrics')
-    count = cursor.fetchone()['count']
-    
-    conn.close()
-    return count
+    return storage.stats()['total_clients']
 
 def get_total_metrics():
     """Get total count of metrics."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT COUNT(*) as count FROM metrics')
-    count = cursor.fetchone()['count']
-    
-    conn.close()
-    return count
+    return storage.stats()['total_metrics']
 
 def get_client_list():
     """Get list of all clients with their info."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT 
-            client_id,
-            client_name,
-            MAX(timestamp) as last_seen,
-            COUNT(*) as metric_count
-        FROM metrics
-        GROUP BY client_id
-    ''')
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    clients = []
-    for row in rows:
-        clients.append({
-            'client_id': row['client_id'],
-            'client_name': row['client_name'] or row['client_id'],
-            'last_seen': row['last_seen'],
-            'metric_count': row['metric_count']
-        })
-    
-    return clients
+    return storage.latest_per_client()
+
+# ==================== EXPORT / IMPORT FUNCTIONS ====================
+
+def iter_metrics(client_id=None, since=None, until=None):
+    """Yield stored metrics oldest-first without loading them all at once."""
+    return storage.iter_range(client_id=client_id, since=since, until=until)
+
+def format_csv(metrics):
+    """Yield CSV text chunks (header first) for metrics."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(METRIC_COLUMNS)
+    yield buf.getvalue()
+    
+    for metric in metrics:
+        buf.seek(0)
+        buf.truncate(0)
+        writer.writerow(metric_to_row(metric['client_id'], metric))
+        yield buf.getvalue()
+
+def format_ndjson(metrics):
+    """Yield one JSON metric per line, in the same shape as GET /api/metrics."""
+    for metric in metrics:
+        yield json.dumps(metric) + '\n'
+
+def parse_csv(lines):
+    """Yield metric dicts from CSV produced by format_csv."""
+    for record in csv.DictReader(lines):
+        if record.get('raw_data'):
+            metric = json.loads(record['raw_data'])
+        else:
+            # No raw payload, rebuild what we can from the columns
+            metric = {
+                'client_name': record.get('client_name') or None,
+                'timestamp': record.get('timestamp') or None,
+                'received_at': record.get('received_at') or None,
+            }
+            for field in ('cpu_percent', 'gpu_percent', 'ping_ms'):
+                if record.get(field):
+                    metric[field] = float(record[field])
+            if record.get('ram_json'):
+                metric['ram'] = json.loads(record['ram_json'])
+            if record.get('internet_connected'):
+                metric['internet_connected'] = record['internet_connected'] in ('1', 'True', 'true')
+        if record.get('client_id'):
+            metric['client_id'] = record['client_id']
+        yield metric
+
+def parse_ndjson(lines):
+    """Yield metric dicts from newline-delimited JSON."""
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+EXPORT_FORMATTERS = {'csv': format_csv, 'ndjson': format_ndjson}
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+IMPORT_PARSERS = {'csv': parse_csv, 'ndjson': parse_ndjson}
+
+def bulk_import_metrics(metrics):
+    """Load metric dicts, skipping (client_id, timestamp) pairs already stored."""
+    return storage.bulk_import(metrics, max_entries)
 
 # ==================== HELPER FUNCTIONS ====================
 
@@ -673,6 +576,41 @@ def get_clients():
         'clients': clients
     }), 200
 
+@app.route('/api/export', methods=['GET'])
+def export_metrics():
+    """API endpoint to stream stored metrics as CSV or NDJSON."""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be one of: {}'.format(', '.join(EXPORT_FORMATS))}), 400
+    
+    rows = iter_metrics(
+        client_id=request.args.get('client_id'),
+        since=request.args.get('since'),
+        until=request.args.get('until')
+    )
+    
+    return Response(
+        stream_with_context(EXPORT_FORMATTERS[fmt](rows)),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={'Content-Disposition': 'attachment; filename=metrics.{}'.format(fmt)}
+    )
+
+@app.route('/api/import', methods=['POST'])
+def import_metrics():
+    """API endpoint to bulk load a CSV or NDJSON export."""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be one of: {}'.format(', '.join(EXPORT_FORMATS))}), 400
+    
+    try:
+        lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+        result = bulk_import_metrics(IMPORT_PARSERS[fmt](lines))
+        
+        return jsonify({'status': 'success', **result}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/health')
 def health():
     """Health check endpoint for Azure."""
@@ -684,6 +622,45 @@ def health():
         'timestamp': datetime.now().isoformat()
     }), 200
 
+# ==================== CLI COMMANDS ====================
+
+@app.cli.command('export-metrics')
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='ndjson')
+@click.option('--client-id', help='Only export this client.')
+@click.option('--since', help='Only export metrics with timestamp >= SINCE.')
+@click.option('--until', help='Only export metrics with timestamp <= UNTIL.')
+@click.option('--output', '-o', type=click.File('wb'), default='-')
+def export_metrics_command(fmt, client_id, since, until, output):
+    """Dump stored metrics to a file or stdout."""
+    init_db()
+    rows = iter_metrics(client_id=client_id, since=since, until=until)
+    # Write bytes so CSV line endings are not translated on Windows
+    for chunk in EXPORT_FORMATTERS[fmt](rows):
+        output.write(chunk.encode('utf-8'))
+
+@app.cli.command('import-metrics')
+@click.argument('source', type=click.File('rb'))
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='ndjson')
+def import_metrics_command(source, fmt):
+    """Bulk load a CSV or NDJSON dump into the database."""
+    init_db()
+    lines = io.TextIOWrapper(source, encoding='utf-8', newline='')
+    result = bulk_import_metrics(IMPORT_PARSERS[fmt](lines))
+    click.echo('Imported {imported} of {received} metrics ({skipped} skipped)'.format(**result))
+
+@app.cli.command('benchmark-storage')
+@click.option('--clients', default=10, show_default=True)
+@click.option('--rows', default=2000, show_default=True)
+def benchmark_storage_command(clients, rows):
+    """Time the same workload on every storage engine."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engines = [SQLiteEngine(os.path.join(tmpdir, 'benchmark.db')), MemoryEngine(capacity=max_entries)]
+        for engine in engines:
+            timings = run_workload(engine, clients, rows, max_entries)
+            click.echo(engine.name)
+            for operation, seconds in timings.items():
+                click.echo('  {:<24} {:9.2f} ms'.format(operation, seconds * 1000))
+
 # ==================== MAIN ====================
 
 if __name__ == '__main__':
@@ -0,0 +1,673 @@
+import sqlite3
+import threading
+import itertools
+import heapq
+import json
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+# Column order shared by the SQLite table, CSV exports and bulk imports
+METRIC_COLUMNS = [
+    'client_id', 'client_name', 'timestamp', 'received_at', 'cpu_percent',
+    'gpu_percent', 'ram_json', 'ping_ms', 'internet_connected', 'raw_data'
+]
+QUERY_BATCH_SIZE = 500
+
+def metric_to_row(client_id, data):
+    """Convert a metric dict into a row tuple in METRIC_COLUMNS order."""
+    # Extract fields
+    ram = data.get('ram')
+
+    # Convert RAM to JSON string
+    ram_json = json.dumps(ram) if ram else None
+
+    # Store complete raw data as JSON
+    raw_data = json.dumps(data)
+
+    return (client_id, data.get('client_name'), data.get('timestamp'), data.get('received_at'),
+            data.get('cpu_percent'), data.get('gpu_percent'), ram_json, data.get('ping_ms'),
+            data.get('internet_connected'), raw_data)
+
+# ==================== ENGINE INTERFACE ====================
+
+class StorageEngine(ABC):
+    """
+    Interface every metrics store implements.
+
+    Metrics are plain dicts as received from clients, with 'client_id' set on
+    the way out. Ordering is always by the client-supplied 'timestamp', with
+    insertion order breaking ties.
+    """
+
+    name = None
+
+    def init(self):
+        """Prepare the store for use."""
+        pass
+
+    @abstractmethod
+    def insert_batch(self, metrics):
+        """Store an iterable of (client_id, data) pairs."""
+
+    @abstractmethod
+    def count(self, client_id):
+        """Get the number of metrics stored for a client."""
+
+    @abstractmethod
+    def apply_retention(self, client_id, max_entries):
+        """Keep only the latest max_entries for a client."""
+
+    @abstractmethod
+    def query_range(self, client_id=None, since=None, until=None, limit=None):
+        """Get metrics newest-first, optionally filtered by client and time range."""
+
+    @abstractmethod
+    def iter_range(self, client_id=None, since=None, until=None):
+        """Yield metrics oldest-first without loading them all at once."""
+
+    @abstractmethod
+    def latest_per_client(self):
+        """Get a summary dict of each client's most recent activity."""
+
+    @abstractmethod
+    def stats(self):
+        """Get total_clients and total_metrics counts."""
+
+    @abstractmethod
+    def bulk_import(self, metrics, max_entries):
+        """
+        Load metric dicts, skipping duplicate (client_id, timestamp) pairs.
+
+        All-or-nothing: if reading the input fails, nothing is stored.
+        Returns a dict with received, imported and skipped counts.
+        """
+
+def _import_rows(metrics, counts):
+    """Yield (client_id, data) for importable metrics, counting everything seen."""
+    for metric in metrics:
+        counts['received'] += 1
+        client_id = metric.get('client_id') or metric.get('client_name')
+        timestamp = metric.get('timestamp')
+        if not client_id or timestamp is None or timestamp == '':
+            continue
+        # Stored timestamps are text; foreign dumps may carry epoch numbers
+        if not isinstance(timestamp, str):
+            metric['timestamp'] = str(timestamp)
+        # Foreign dumps may lack (or null out) the server-side timestamp
+        if not metric.get('received_at'):
+            metric['received_at'] = datetime.now().isoformat()
+        yield client_id, metric
+
+# ==================== SQLITE ENGINE ====================
+
+class SQLiteEngine(StorageEngine):
+    """Metrics stored in a single SQLite table."""
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """Get a database connection."""
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init(self):
+        """Initialize the SQLite database."""
+        with self.lock:
+            conn = self.connect()
+            cursor = conn.cursor()
+
+            # Create metrics table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS metrics (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    client_id TEXT NOT NULL,
+                    client_name TEXT,
+                    timestamp TEXT NOT NULL,
+                    received_at TEXT NOT NULL,
+                    cpu_percent REAL,
+                    gpu_percent REAL,
+                    ram_json TEXT,
+                    ping_ms REAL,
+                    internet_connected INTEGER,
+                    raw_data TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            # Create index for faster queries
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_client_id ON metrics(client_id)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_timestamp ON metrics(timestamp DESC)
+            ''')
+
+            conn.commit()
+            conn.close()
+
+    def insert_batch(self, metrics):
+        with self.lock:
+            conn = self.connect()
+            conn.executemany('''
+                INSERT INTO metrics
+                (client_id, client_name, timestamp, received_at, cpu_percent, gpu_percent,
+                 ram_json, ping_ms, internet_connected, raw_data)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (metric_to_row(client_id, data) for client_id, data in metrics))
+            conn.commit()
+            conn.close()
+
+    def count(self, client_id):
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute('SELECT COUNT(*) as count FROM metrics WHERE client_id = ?', (client_id,))
+        count = cursor.fetchone()['count']
+
+        conn.close()
+        return count
+
+    def apply_retention(self, client_id, max_entries):
+        with self.lock:
+            conn = self.connect()
+            cursor = conn.cursor()
+
+            # Count entries for this client
+            cursor.execute('SELECT COUNT(*) as count FROM metrics WHERE client_id = ?', (client_id,))
+            count = cursor.fetchone()['count']
+
+            if count > max_entries:
+                # Delete oldest entries
+                cursor.execute('''
+                    DELETE FROM metrics
+                    WHERE client_id = ?
+                    AND id NOT IN (
+                        SELECT id FROM metrics
+                        WHERE client_id = ?
+                        ORDER BY timestamp DESC, id DESC
+                        LIMIT ?
+                    )
+                ''', (client_id, client_id, max_entries))
+                conn.commit()
+
+            conn.close()
+
+    def _range_query(self, client_id, since, until, order, after=None):
+        """Build the SELECT for a filtered range of metrics."""
+        conditions = []
+        params = []
+        if client_id:
+            conditions.append('client_id = ?')
+            params.append(client_id)
+        if since:
+            conditions.append('timestamp >= ?')
+            params.append(since)
+        if until:
+            conditions.append('timestamp <= ?')
+            params.append(until)
+        if after:
+            # Keyset paging: resume after the last (timestamp, id) seen
+            conditions.append('(timestamp, id) > (?, ?)')
+            params.extend(after)
+
+        query = 'SELECT id, client_id, timestamp, raw_data FROM metrics'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY timestamp {0}, id {0}'.format(order)
+        return query, params
+
+    @staticmethod
+    def _row_to_metric(row):
+        metric = json.loads(row['raw_data'])
+        metric['client_id'] = row['client_id']
+        return metric
+
+    def query_range(self, client_id=None, since=None, until=None, limit=None):
+        query, params = self._range_query(client_id, since, until, 'DESC')
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        conn.close()
+
+        return [self._row_to_metric(row) for row in rows]
+
+    def iter_range(self, client_id=None, since=None, until=None):
+        # Each batch is a separate, fully read query so no read lock is held
+        # while the consumer (e.g. a slow download) works through the rows
+        after = None
+        while True:
+            query, params = self._range_query(client_id, since, until, 'ASC', after)
+            query += ' LIMIT ?'
+            params.append(QUERY_BATCH_SIZE)
+
+            conn = self.connect()
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            conn.close()
+
+            for row in rows:
+                yield self._row_to_metric(row)
+            if len(rows) < QUERY_BATCH_SIZE:
+                break
+            after = (rows[-1]['timestamp'], rows[-1]['id'])
+
+    def latest_per_client(self):
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT
+                client_id,
+                client_name,
+                MAX(timestamp) as last_seen,
+                COUNT(*) as metric_count
+            FROM metrics
+            GROUP BY client_id
+        ''')
+
+        rows = cursor.fetchall()
+        conn.close()
+
+        clients = []
+        for row in rows:
+            clients.append({
+                'client_id': row['client_id'],
+                'client_name': row['client_name'] or row['client_id'],
+                'last_seen': row['last_seen'],
+                'metric_count': row['metric_count']
+            })
+
+        return clients
+
+    def stats(self):
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute('SELECT COUNT(DISTINCT client_id) as clients, COUNT(*) as count FROM metrics')
+        row = cursor.fetchone()
+
+        conn.close()
+        return {'total_clients': row['clients'], 'total_metrics': row['count']}
+
+    def bulk_import(self, metrics, max_entries):
+        """
+        Load metric dicts in a single transaction.
+
+        The input is first parsed into a connection-local temp table that drops
+        duplicate (client_id, timestamp) pairs, without holding the engine lock,
+        so a slow upload does not stall regular inserts. The copy into metrics,
+        skipping pairs already stored, then runs under the lock in one
+        transaction, and the timestamp index is rebuilt once at the end instead
+        of on every insert.
+        """
+        counts = {'received': 0}
+        rows = (metric_to_row(client_id, data) for client_id, data in _import_rows(metrics, counts))
+
+        columns = ', '.join(METRIC_COLUMNS)
+        conn = self.connect()
+        conn.isolation_level = None  # Manage the transactions explicitly
+        cursor = conn.cursor()
+        try:
+            # Stage: only the temp database is written here
+            cursor.execute('BEGIN')
+            cursor.execute('''
+                CREATE TEMP TABLE import_metrics (
+                    client_id TEXT NOT NULL,
+                    client_name TEXT,
+                    timestamp TEXT NOT NULL,
+                    received_at TEXT,
+                    cpu_percent REAL,
+                    gpu_percent REAL,
+                    ram_json TEXT,
+                    ping_ms REAL,
+                    internet_connected INTEGER,
+                    raw_data TEXT,
+                    UNIQUE (client_id, timestamp)
+                )
+            ''')
+            cursor.executemany(
+                'INSERT OR IGNORE INTO import_metrics ({}) VALUES ({})'.format(
+                    columns, ', '.join('?' * len(METRIC_COLUMNS))),
+                rows)
+            cursor.execute('COMMIT')
+
+            cursor.execute('SELECT DISTINCT client_id FROM import_metrics')
+            client_ids = [row['client_id'] for row in cursor.fetchall()]
+
+            with self.lock:
+                cursor.execute('BEGIN')
+                try:
+                    # idx_client_id stays to serve the duplicate lookups below
+                    cursor.execute('DROP INDEX IF EXISTS idx_timestamp')
+                    cursor.execute('''
+                        INSERT INTO metrics ({0})
+                        SELECT {0} FROM import_metrics AS i
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM metrics AS m
+                            WHERE m.client_id = i.client_id AND m.timestamp = i.timestamp
+                        )
+                    '''.format(columns))
+                    imported = cursor.rowcount
+                    cursor.execute('''
+                        CREATE INDEX IF NOT EXISTS idx_timestamp ON metrics(timestamp DESC)
+                    ''')
+                    cursor.execute('COMMIT')
+                except Exception:
+                    cursor.execute('ROLLBACK')
+                    raise
+        except Exception:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            raise
+        finally:
+            # The temp table goes away with the connection
+            conn.close()
+
+        # Apply the usual per-client retention to imported clients
+        for client_id in client_ids:
+            self.apply_retention(client_id, max_entries)
+
+        return {
+            'received': counts['received'],
+            'imported': imported,
+            'skipped': counts['received'] - imported
+        }
+
+# ==================== MEMORY ENGINE ====================
+
+class _Series:
+    """
+    Ring buffer holding one client's metrics as (timestamp, seq, metric).
+
+    Metrics normally arrive in timestamp order, so retention just advances
+    the start of the ring. A late arrival marks the series unordered and the
+    next read or trim sorts it once. The buffer doubles if it fills before a
+    trim, and shrinks back once a trim has dropped the excess.
+    """
+
+    __slots__ = ('entries', 'capacity', 'start', 'size', 'ordered', 'timestamps')
+
+    def __init__(self, capacity):
+        self.capacity = max(capacity, 1)
+        self.entries = [None] * self.capacity
+        self.start = 0
+        self.size = 0
+        self.ordered = True  # entries are in (timestamp, seq) order
+        self.timestamps = {}  # timestamp -> number of entries with it
+
+    def _resize(self, slots):
+        """Unroll the ring into a buffer with the given number of slots."""
+        entries = list(self)
+        self.entries = entries + [None] * (slots - len(entries))
+        self.start = 0
+
+    def append(self, entry):
+        if self.size == len(self.entries):
+            # Full before a trim, e.g. during a bulk import
+            self._resize(2 * len(self.entries))
+        capacity = len(self.entries)
+        if self.size and entry < self.entries[(self.start + self.size - 1) % capacity]:
+            self.ordered = False
+        self.entries[(self.start + self.size) % capacity] = entry
+        self.size += 1
+        self.timestamps[entry[0]] = self.timestamps.get(entry[0], 0) + 1
+
+    def _forget(self, timestamp):
+        remaining = self.timestamps[timestamp] - 1
+        if remaining:
+            self.timestamps[timestamp] = remaining
+        else:
+            del self.timestamps[timestamp]
+
+    def __iter__(self):
+        capacity = len(self.entries)
+        for i in range(self.size):
+            yield self.entries[(self.start + i) % capacity]
+
+    def __reversed__(self):
+        capacity = len(self.entries)
+        for i in range(self.size - 1, -1, -1):
+            yield self.entries[(self.start + i) % capacity]
+
+    def sort(self):
+        """Restore (timestamp, seq) order after late arrivals."""
+        if not self.ordered:
+            self.entries = sorted(self) + [None] * (len(self.entries) - self.size)
+            self.start = 0
+            self.ordered = True
+
+    def trim(self, max_entries):
+        """Drop all but the max_entries newest metrics by timestamp."""
+        excess = self.size - max_entries
+        if excess <= 0:
+            return
+        self.sort()
+
+        capacity = len(self.entries)
+        for _ in range(excess):
+            self._forget(self.entries[self.start][0])
+            self.entries[self.start] = None
+            self.start = (self.start + 1) % capacity
+        self.size -= excess
+
+        # Give back slots grown during a bulk load
+        slots = max(self.capacity, self.size + 1)
+        if capacity > slots:
+            self._resize(slots)
+
+class MemoryEngine(StorageEngine):
+    """
+    Metrics held in process memory, one ring buffer per client.
+
+    Retention follows the same rule as SQLite: apply_retention keeps each
+    client's newest metrics by timestamp, with insertion order breaking ties.
+    Timestamps are ordered as text, like SQLite's TEXT column. `capacity`
+    only sizes the buffers. Nothing survives a restart.
+    """
+
+    name = 'memory'
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.series = {}
+        self.sequence = itertools.count()  # global insertion order, like SQLite's id
+        self.lock = threading.Lock()
+
+    def _append(self, client_id, data):
+        metric = dict(data)
+        metric['client_id'] = client_id
+        timestamp = metric['timestamp']
+        if not isinstance(timestamp, str):
+            timestamp = str(timestamp)
+        series = self.series.get(client_id)
+        if series is None:
+            # One spare slot for the insert that precedes each retention pass
+            series = self.series[client_id] = _Series(self.capacity + 1)
+        series.append((timestamp, next(self.sequence), metric))
+
+    def insert_batch(self, metrics):
+        metrics = list(metrics)
+        # Validate up front so a bad metric stores nothing, as with SQLite
+        for client_id, data in metrics:
+            if data.get('timestamp') is None:
+                raise ValueError('timestamp is required')
+        with self.lock:
+            for client_id, data in metrics:
+                self._append(client_id, data)
+
+    def count(self, client_id):
+        series = self.series.get(client_id)
+        return series.size if series else 0
+
+    def apply_retention(self, client_id, max_entries):
+        with self.lock:
+            series = self.series.get(client_id)
+            if series:
+                series.trim(max_entries)
+
+    def _sorted_series(self, client_id):
+        """Get the series a query reads, each in order. Call with the lock held."""
+        if client_id:
+            selected = [self.series[client_id]] if client_id in self.series else []
+        else:
+            selected = list(self.series.values())
+        for series in selected:
+            series.sort()
+        return selected
+
+    @staticmethod
+    def _in_range(entries, since, until, newest_first):
+        """Filter one sorted series, stopping once past the far end of the range."""
+        for entry in entries:
+            timestamp = entry[0]
+            if since and timestamp < since:
+                if newest_first:
+                    break
+                continue
+            if until and timestamp > until:
+                if newest_first:
+                    continue
+                break
+            yield entry
+
+    def query_range(self, client_id=None, since=None, until=None, limit=None):
+        with self.lock:
+            merged = heapq.merge(
+                *(self._in_range(reversed(series), since, until, True)
+                  for series in self._sorted_series(client_id)),
+                reverse=True)
+            entries = list(itertools.islice(merged, limit))
+        # Copy only the rows being returned
+        return [dict(metric) for _, _, metric in entries]
+
+    def iter_range(self, client_id=None, since=None, until=None):
+        # Retention bounds each client's series, so a snapshot is cheap
+        with self.lock:
+            entries = list(heapq.merge(
+                *(self._in_range(iter(series), since, until, False)
+                  for series in self._sorted_series(client_id))))
+        for _, _, metric in entries:
+            yield dict(metric)
+
+    def latest_per_client(self):
+        clients = []
+        with self.lock:
+            for client_id, series in self.series.items():
+                if not series.size:
+                    continue
+                timestamp, _, latest = max(series)
+                clients.append({
+                    'client_id': client_id,
+                    'client_name': latest.get('client_name') or client_id,
+                    'last_seen': timestamp,
+                    'metric_count': series.size
+                })
+        return clients
+
+    def stats(self):
+        with self.lock:
+            sizes = [series.size for series in self.series.values() if series.size]
+        return {'total_clients': len(sizes), 'total_metrics': sum(sizes)}
+
+    def bulk_import(self, metrics, max_entries):
+        """
+        Load metric dicts all-or-nothing.
+
+        The whole input is read and deduplicated before the store is touched,
+        so an input that fails partway imports nothing.
+        """
+        counts = {'received': 0}
+        staged = {}  # (client_id, timestamp) -> data, first occurrence wins
+        for client_id, data in _import_rows(metrics, counts):
+            staged.setdefault((client_id, data['timestamp']), data)
+
+        imported = 0
+        touched = set()
+        with self.lock:
+            for (client_id, timestamp), data in staged.items():
+                series = self.series.get(client_id)
+                if series is not None and timestamp in series.timestamps:
+                    continue
+                self._append(client_id, data)
+                touched.add(client_id)
+                imported += 1
+
+        # Apply the usual per-client retention to imported clients
+        for client_id in touched:
+            self.apply_retention(client_id, max_entries)
+
+        return {
+            'received': counts['received'],
+            'imported': imported,
+            'skipped': counts['received'] - imported
+        }
+
+# ==================== BENCHMARK ====================
+
+def _workload_metric(i, client_id, day):
+    return {
+        'client_id': client_id,
+        'client_name': client_id,
+        'timestamp': '2026-01-{:02d}T00:00:00.{:06d}'.format(day, i),
+        'received_at': '2026-01-{:02d}T00:00:00.{:06d}'.format(day, i),
+        'cpu_percent': float(i % 100),
+        'ram': {'used_gb': 4.0, 'total_gb': 16.0, 'percent': 25.0},
+        'ping_ms': float(i % 50),
+        'internet_connected': True
+    }
+
+def run_workload(engine, clients=10, rows=2000, max_entries=100):
+    """
+    Drive an engine through the operations the server performs.
+
+    Returns the seconds spent on each operation.
+    """
+    engine.init()
+    timings = {}
+
+    start = time.perf_counter()
+    for i in range(rows):
+        client_id = 'client-{}'.format(i % clients)
+        engine.insert_batch([(client_id, _workload_metric(i, client_id, 1))])
+        engine.count(client_id)
+        engine.apply_retention(client_id, max_entries)
+    timings['insert'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(100):
+        engine.query_range(limit=50)
+    timings['query_range x100'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(100):
+        engine.latest_per_client()
+    timings['latest_per_client x100'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(100):
+        engine.stats()
+    timings['stats x100'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    list(engine.iter_range(client_id='client-0'))
+    timings['iter_range'] = time.perf_counter() - start
+
+    # New clients and timestamps, so every row takes the insert path
+    dump = [_workload_metric(i, 'imported-{}'.format(i % clients), 2) for i in range(rows)]
+    start = time.perf_counter()
+    engine.bulk_import(dump, max_entries)
+    timings['bulk_import'] = time.perf_counter() - start
+
+    return timings
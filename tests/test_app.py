@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+import app as server
+from storage import MemoryEngine, SQLiteEngine
+
+FOREIGN_CSV = (
+    'client_id,client_name,timestamp,received_at,cpu_percent,gpu_percent,'
+    'ram_json,ping_ms,internet_connected,raw_data\r\n'
+    'z,,2026-03-01,,5,,,,1,\r\n'
+)
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def engine(request, tmp_path, monkeypatch):
+    """Point the app at a fresh store, once per engine."""
+    if request.param == 'sqlite':
+        engine = SQLiteEngine(str(tmp_path / 'metrics.db'))
+    else:
+        engine = MemoryEngine(capacity=server.max_entries)
+    monkeypatch.setattr(server, 'storage', engine)
+    server.init_db()
+    return engine
+
+@pytest.fixture
+def client(engine):
+    return server.app.test_client()
+
+def post_metric(client, client_name, timestamp, **fields):
+    data = {'client_name': client_name, 'timestamp': timestamp}
+    data.update(fields)
+    response = client.post('/api/metrics', json=data)
+    assert response.status_code == 200
+
+def ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+# ==================== HTTP ====================
+
+@pytest.mark.parametrize('fmt', ['csv', 'ndjson'])
+def test_export_import_round_trip(client, fmt):
+    post_metric(client, 'a', '2026-01-01', cpu_percent=10.0, ram={'percent': 50})
+    post_metric(client, 'b', '2026-01-02', internet_connected=False)
+
+    exported = client.get('/api/export?format={}'.format(fmt))
+    assert exported.status_code == 200
+    assert exported.mimetype == server.EXPORT_MIMETYPES[fmt]
+
+    response = client.post('/api/import?format={}'.format(fmt), data=exported.get_data())
+
+    assert response.status_code == 200
+    assert response.get_json() == {'status': 'success', 'received': 2, 'imported': 0, 'skipped': 2}
+
+def test_export_filters_by_client_and_time(client):
+    for day in range(1, 5):
+        post_metric(client, 'a', '2026-01-0{}'.format(day))
+        post_metric(client, 'b', '2026-01-0{}'.format(day))
+
+    response = client.get('/api/export?client_id=a&since=2026-01-02&until=2026-01-03')
+
+    assert [(m['client_id'], m['timestamp']) for m in ndjson(response)] == [
+        ('a', '2026-01-02'), ('a', '2026-01-03')]
+
+def test_import_foreign_csv_without_raw_data(client):
+    response = client.post('/api/import?format=csv', data=FOREIGN_CSV)
+
+    assert response.get_json()['imported'] == 1
+    metric = client.get('/api/metrics').get_json()['metrics'][0]
+    assert metric['client_id'] == 'z'
+    assert metric['timestamp'] == '2026-03-01'
+    assert metric['cpu_percent'] == 5.0
+    assert metric['internet_connected'] is True
+    assert metric['received_at']
+
+def test_import_fills_null_received_at_and_numeric_timestamp(client):
+    lines = '\n'.join(json.dumps(m) for m in [
+        {'client_id': 'a', 'timestamp': '2026-01-01', 'received_at': None},
+        {'client_id': 'b', 'timestamp': 1700000000},
+    ])
+
+    response = client.post('/api/import?format=ndjson', data=lines)
+
+    assert response.get_json()['imported'] == 2
+    assert client.get('/').status_code == 200
+    metrics = client.get('/api/metrics').get_json()['metrics']
+    assert [m['timestamp'] for m in metrics] == ['2026-01-01', '1700000000']
+    assert all(m['received_at'] for m in metrics)
+
+@pytest.mark.parametrize('method, path', [('get', '/api/export'), ('post', '/api/import')])
+def test_unknown_format_is_rejected(client, method, path):
+    response = getattr(client, method)(path + '?format=xml')
+
+    assert response.status_code == 400
+    assert 'format' in response.get_json()['error']
+
+# ==================== CLI ====================
+
+def test_cli_export_on_fresh_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, 'storage', SQLiteEngine(str(tmp_path / 'metrics.db')))
+
+    result = server.app.test_cli_runner().invoke(args=['export-metrics', '--format', 'csv'])
+
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == [','.join(server.METRIC_COLUMNS)]
+
+@pytest.mark.parametrize('fmt', ['csv', 'ndjson'])
+def test_cli_export_import_round_trip(client, tmp_path, fmt):
+    post_metric(client, 'a', '2026-01-01', cpu_percent=10.0)
+    post_metric(client, 'a', '2026-01-02', cpu_percent=20.0)
+    dump = tmp_path / 'dump.{}'.format(fmt)
+    runner = server.app.test_cli_runner()
+
+    result = runner.invoke(args=['export-metrics', '--format', fmt, '--client-id', 'a',
+                                 '--since', '2026-01-02', '-o', str(dump)])
+    assert result.exit_code == 0, result.output
+
+    result = runner.invoke(args=['import-metrics', str(dump), '--format', fmt])
+    assert result.exit_code == 0, result.output
+    assert result.output.strip() == 'Imported 0 of 1 metrics (1 skipped)'
+
+def test_cli_import_foreign_csv(engine, tmp_path):
+    dump = tmp_path / 'foreign.csv'
+    dump.write_bytes(FOREIGN_CSV.encode('utf-8'))
+
+    result = server.app.test_cli_runner().invoke(args=['import-metrics', str(dump), '--format', 'csv'])
+
+    assert result.exit_code == 0, result.output
+    assert result.output.strip() == 'Imported 1 of 1 metrics (0 skipped)'
+    assert engine.count('z') == 1
@@ -0,0 +1,216 @@
+import json
+
+import pytest
+
+import storage
+from storage import MemoryEngine, SQLiteEngine, StorageEngine
+
+MAX_ENTRIES = 5
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def engine(request, tmp_path):
+    """Each test runs once per engine."""
+    if request.param == 'sqlite':
+        engine = SQLiteEngine(str(tmp_path / 'metrics.db'))
+    else:
+        engine = MemoryEngine(capacity=MAX_ENTRIES)
+    engine.init()
+    return engine
+
+def metric(timestamp, **fields):
+    data = {'timestamp': timestamp, 'received_at': timestamp}
+    data.update(fields)
+    return data
+
+def insert(engine, client_id, timestamp, **fields):
+    """Insert the way app.insert_metric does: insert, then apply retention."""
+    engine.insert_batch([(client_id, metric(timestamp, **fields))])
+    engine.apply_retention(client_id, MAX_ENTRIES)
+
+def timestamps(metrics):
+    return [m['timestamp'] for m in metrics]
+
+# ==================== QUERIES ====================
+
+def test_query_range_newest_first_with_limit(engine):
+    for day in range(1, 4):
+        insert(engine, 'a', '2026-01-0{}'.format(day), cpu_percent=day)
+
+    metrics = engine.query_range(limit=2)
+
+    assert timestamps(metrics) == ['2026-01-03', '2026-01-02']
+    assert metrics[0]['client_id'] == 'a'
+    assert metrics[0]['cpu_percent'] == 3
+
+def test_query_range_filters_client_and_time(engine):
+    for day in range(1, 5):
+        insert(engine, 'a', '2026-01-0{}'.format(day))
+        insert(engine, 'b', '2026-01-0{}'.format(day))
+
+    metrics = engine.query_range(client_id='a', since='2026-01-02', until='2026-01-03')
+
+    assert [(m['client_id'], m['timestamp']) for m in metrics] == [
+        ('a', '2026-01-03'), ('a', '2026-01-02')]
+
+def test_equal_timestamps_ordered_by_insertion(engine):
+    insert(engine, 'a', '2026-01-01', cpu_percent=1)
+    insert(engine, 'b', '2026-01-01', cpu_percent=2)
+    insert(engine, 'a', '2026-01-01', cpu_percent=3)
+
+    assert [m['cpu_percent'] for m in engine.query_range()] == [3, 2, 1]
+    assert [m['cpu_percent'] for m in engine.iter_range()] == [1, 2, 3]
+
+def test_iter_range_oldest_first_across_batches(engine, monkeypatch):
+    monkeypatch.setattr(storage, 'QUERY_BATCH_SIZE', 2)
+    for day in range(1, 6):
+        insert(engine, 'a', '2026-01-0{}'.format(day))
+        insert(engine, 'b', '2026-01-0{}'.format(day))
+
+    metrics = list(engine.iter_range(since='2026-01-02', until='2026-01-04'))
+
+    assert [(m['client_id'], m['timestamp']) for m in metrics] == [
+        ('a', '2026-01-02'), ('b', '2026-01-02'),
+        ('a', '2026-01-03'), ('b', '2026-01-03'),
+        ('a', '2026-01-04'), ('b', '2026-01-04')]
+
+def test_query_range_limit_after_late_arrivals(engine):
+    engine.insert_batch([('a', metric(ts)) for ts in ('2026-01-01', '2026-01-05', '2026-01-03')])
+    engine.insert_batch([('b', metric(ts)) for ts in ('2026-01-04', '2026-01-02')])
+
+    metrics = engine.query_range(since='2026-01-02', until='2026-01-04', limit=2)
+
+    assert [(m['client_id'], m['timestamp']) for m in metrics] == [
+        ('b', '2026-01-04'), ('a', '2026-01-03')]
+    assert timestamps(engine.iter_range(until='2026-01-03')) == [
+        '2026-01-01', '2026-01-02', '2026-01-03']
+
+def test_mixed_timestamp_types_order_as_text(engine):
+    insert(engine, 'a', '2026-01-01')
+    insert(engine, 'b', 1700000000)
+    insert(engine, 'c', 1.5)
+
+    assert [m['client_id'] for m in engine.query_range()] == ['a', 'b', 'c']
+    assert [m['client_id'] for m in engine.iter_range(since='1700000000')] == ['b', 'a']
+    assert sorted((c['client_id'], c['last_seen']) for c in engine.latest_per_client()) == [
+        ('a', '2026-01-01'), ('b', '1700000000'), ('c', '1.5')]
+
+def test_latest_per_client_and_stats(engine):
+    insert(engine, 'a', '2026-01-01', client_name='Alpha')
+    insert(engine, 'a', '2026-01-02', client_name='Alpha')
+    insert(engine, 'b', '2026-01-01')
+
+    clients = sorted(engine.latest_per_client(), key=lambda c: c['client_id'])
+
+    assert clients == [
+        {'client_id': 'a', 'client_name': 'Alpha', 'last_seen': '2026-01-02', 'metric_count': 2},
+        {'client_id': 'b', 'client_name': 'b', 'last_seen': '2026-01-01', 'metric_count': 1}]
+    assert engine.stats() == {'total_clients': 2, 'total_metrics': 3}
+    assert engine.count('a') == 2
+    assert engine.count('missing') == 0
+
+# ==================== RETENTION ====================
+
+def test_retention_keeps_newest_by_timestamp(engine):
+    for day in range(1, 8):
+        insert(engine, 'a', '2026-01-0{}'.format(day))
+
+    assert timestamps(engine.query_range()) == [
+        '2026-01-07', '2026-01-06', '2026-01-05', '2026-01-04', '2026-01-03']
+
+def test_late_insert_does_not_evict_newer_metrics(engine):
+    for day in range(1, 6):
+        insert(engine, 'a', '2026-01-0{}'.format(day))
+
+    insert(engine, 'a', '2020-01-01')
+
+    assert timestamps(engine.query_range()) == [
+        '2026-01-05', '2026-01-04', '2026-01-03', '2026-01-02', '2026-01-01']
+
+def test_late_insert_newer_than_oldest_is_kept(engine):
+    for day in (1, 3, 5, 7, 9):
+        insert(engine, 'a', '2026-01-0{}'.format(day))
+
+    insert(engine, 'a', '2026-01-04')
+
+    assert timestamps(engine.query_range()) == [
+        '2026-01-09', '2026-01-07', '2026-01-05', '2026-01-04', '2026-01-03']
+
+# ==================== BULK IMPORT ====================
+
+def test_bulk_import_skips_stored_and_repeated_metrics(engine):
+    insert(engine, 'a', '2026-01-01')
+
+    result = engine.bulk_import([
+        {'client_id': 'a', 'timestamp': '2026-01-01'},
+        {'client_id': 'a', 'timestamp': '2026-01-02', 'cpu_percent': 1},
+        {'client_id': 'a', 'timestamp': '2026-01-02', 'cpu_percent': 2},
+        {'client_name': 'b', 'timestamp': '2026-01-02'},
+        {'client_id': 'c'},
+    ], MAX_ENTRIES)
+
+    assert result == {'received': 5, 'imported': 2, 'skipped': 3}
+    assert engine.query_range(client_id='a')[0]['cpu_percent'] == 1
+    assert engine.query_range(client_id='b')[0]['received_at']
+
+def test_bulk_import_of_old_backup_keeps_live_data(engine):
+    for day in range(1, 6):
+        insert(engine, 'a', '2026-01-0{}'.format(day))
+
+    result = engine.bulk_import(
+        [{'client_id': 'a', 'timestamp': '2025-12-2{}'.format(day)} for day in range(5)],
+        MAX_ENTRIES)
+
+    assert result['imported'] == 5
+    assert timestamps(engine.query_range()) == [
+        '2026-01-05', '2026-01-04', '2026-01-03', '2026-01-02', '2026-01-01']
+
+def test_bulk_import_failing_partway_stores_nothing(engine):
+    insert(engine, 'a', '2026-01-01')
+
+    def lines():
+        yield json.dumps({'client_id': 'a', 'timestamp': '2026-01-02'})
+        yield '{not json'
+
+    with pytest.raises(ValueError):
+        engine.bulk_import((json.loads(line) for line in lines()), MAX_ENTRIES)
+
+    assert timestamps(engine.query_range()) == ['2026-01-01']
+
+def test_bulk_import_round_trips_export(engine):
+    for day in range(1, 4):
+        insert(engine, 'a', '2026-01-0{}'.format(day), ram={'percent': 50})
+    exported = list(engine.iter_range())
+
+    assert engine.bulk_import(exported, MAX_ENTRIES)['imported'] == 0
+    assert engine.query_range(client_id='a')[0]['ram'] == {'percent': 50}
+
+# ==================== ENGINE SPECIFIC ====================
+
+def test_engine_missing_a_method_cannot_be_created():
+    class Incomplete(StorageEngine):
+        def insert_batch(self, metrics):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_memory_buffer_shrinks_after_bulk_import_is_trimmed():
+    engine = MemoryEngine(capacity=MAX_ENTRIES)
+    engine.bulk_import(
+        [{'client_id': 'a', 'timestamp': '2026-01-01T{:04d}'.format(i)} for i in range(50)],
+        MAX_ENTRIES)
+
+    assert engine.count('a') == MAX_ENTRIES
+    assert len(engine.series['a'].entries) == MAX_ENTRIES + 1
+
+def test_sqlite_paused_export_does_not_block_writers(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'QUERY_BATCH_SIZE', 10)
+    engine = SQLiteEngine(str(tmp_path / 'metrics.db'))
+    engine.init()
+    engine.insert_batch(('a', metric('2026-01-01T{:04d}'.format(i))) for i in range(50))
+
+    export = engine.iter_range()
+    next(export)
+    engine.insert_batch([('a', metric('2027-01-01'))])
+
+    assert len(list(export)) == 50